@@ -1,6 +1,6 @@
 from airflow import DAG
 from airflow.operators.python import PythonOperator
-from datetime import datetime
+from datetime import datetime, timezone
 import os, fitz, boto3, traceback
 from airflow.providers.amazon.aws.hooks.s3 import S3Hook
 from dotenv import load_dotenv
@@ -12,6 +12,8 @@ ROOT_DIR = "/opt/airflow/dags/University_Folders"
 TMP_MD_DIR = "/opt/airflow/shared_markdowns"
 S3_BUCKET = os.getenv("S3_BUCKET_NAME")
 AWS_REGION = os.getenv("AWS_REGION")
+# Read by every backend instance (CACHE_GENERATION_URL); a new value drops cached answers
+CACHE_GENERATION_KEY = "cache/generation"
 
 # === Setup DAG ===
 default_args = {
@@ -83,6 +85,18 @@ def upload_to_s3():
             except Exception as e:
                 print(f"❌ Failed to upload {filename} to S3: {e}")
 
+# === Step 3: Publish a new data generation so every backend instance drops cached answers ===
+def publish_cache_generation():
+    s3_hook = S3Hook(aws_conn_id='aws_default')
+    generation = datetime.now(timezone.utc).isoformat()
+
+    s3_hook.load_string(
+        string_data=generation,
+        key=CACHE_GENERATION_KEY,
+        bucket_name=S3_BUCKET,
+        replace=True
+    )
+    print(f"🧹 Published cache generation: {generation}")
 
 # === DAG Tasks ===
 task_convert = PythonOperator(
@@ -97,4 +111,10 @@ task_upload = PythonOperator(
     dag=dag
 )
 
-task_convert >> task_upload
+task_publish_generation = PythonOperator(
+    task_id="publish_cache_generation",
+    python_callable=publish_cache_generation,
+    dag=dag
+)
+
+task_convert >> task_upload >> task_publish_generation
@@ -1,13 +1,19 @@
 # main.py (FastAPI backend)
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header
 from pydantic import BaseModel
 from typing import Optional
 import uuid
 from datetime import datetime, timezone 
-from multi_Agents.multi_agent import app as langgraph_app  # Your existing LangGraph workflow
+from multi_Agents.multi_agent import run_recommendation, stream_recommendation, invalidate_response_cache  # Your existing LangGraph workflow behind the response cache
 from multi_Agents.multiagent_compare import app as comparison_workflow
 from fastapi import BackgroundTasks
+from sse_starlette.sse import EventSourceResponse
+import orjson
 import subprocess
+import hmac
+import logging
+import logging.handlers
+import queue
 import asyncio
 from agents import Agent, Runner
 from agents.mcp import MCPServerStdio
@@ -15,9 +21,26 @@ from openai import OpenAI
 import os
 from dotenv import load_dotenv
 from multi_Agents.app_deadline import process_deadline_query
+from multi_Agents.http_client import aclose_http_client
 
 load_dotenv()
+
+# Log records go through a queue so stdout writes happen on a background thread, not the event loop.
+# force=True replaces the handlers that imported modules installed; LOG_LEVEL=DEBUG enables payload dumps.
+# The QueueHandler formats each record, so the listener's handler writes it as-is.
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.handlers.QueueHandler(_log_queue)],
+    force=True
+)
+_log_listener.start()
+
 app = FastAPI()
+app.add_event_handler("shutdown", aclose_http_client)
+app.add_event_handler("shutdown", _log_listener.stop)
 
 # Session management in memory (replace with DB in production)
 sessions = {}
@@ -45,37 +68,12 @@ async def create_session():
     sessions[session_id] = UserSession(session_id=session_id)
     return {"session_id": session_id}
 
-@app.post("/recommend")
-async def get_recommendations(request: RecommendationRequest):
-    # Validate session
-    if request.session_id and request.session_id not in sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-
-    # Prepare initial state for LangGraph
-    langgraph_state = {
-        "user_query": request.prompt,
-        "combined_agent_results": None,
-        "snowflake_results": [],
-        "rag_results": [],
-        "web_results": [],
-        "final_output": None,
-        "is_college_related": False,
-        "safety_check_passed": False,
-        "early_response": None,
-        "fallback_used": False,
-        "fallback_message": None
-    }
-
-    # Execute the workflow
-    try:
-        result = await langgraph_app.ainvoke(langgraph_state)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Workflow execution failed: {str(e)}")
-    
+def _build_recommendation_response(prompt: str, result: dict) -> dict:
+    """Shape a workflow result into the response envelope shared by /recommend and /recommend/stream"""
     # Build unified response
     response = {
         "success": True,
-        "query": request.prompt,
+        "query": prompt,
         "message": None,  # Primary display message
         "data": {
             "colleges": [],
@@ -124,20 +122,83 @@ async def get_recommendations(request: RecommendationRequest):
         response["success"] = False
         response["message"] = "No results found for your query"
 
+    return response
+
+def _record_recommendation(session_id: str, prompt: str, response: dict, result: dict):
+    sessions[session_id].history.append({
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "prompt": prompt,
+        "response": response,
+        "workflow_metadata": {
+            "fallback_used": result.get("fallback_used", False),
+            "is_college_related": result.get("is_college_related", False)
+        }
+    })
+
+@app.post("/recommend")
+async def get_recommendations(request: RecommendationRequest):
+    # Validate session
+    if request.session_id and request.session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    # Execute the workflow (cached answers skip it entirely)
+    try:
+        result = await run_recommendation(request.prompt)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Workflow execution failed: {str(e)}")
+    
+    response = _build_recommendation_response(request.prompt, result)
+
+    # Early responses are not stored in the session
+    if result.get("early_response"):
+        return response
+
     # Store in session if available
     if request.session_id:
-        sessions[request.session_id].history.append({
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "prompt": request.prompt,
-            "response": response,
-            "workflow_metadata": {
-                "fallback_used": result.get("fallback_used", False),
-                "is_college_related": result.get("is_college_related", False)
-            }
-        })
+        _record_recommendation(request.session_id, request.prompt, response, result)
 
     return response
 
+@app.post("/recommend/stream")
+async def stream_recommendations(request: RecommendationRequest):
+    """Server-Sent Events version of /recommend: one event per finished workflow node"""
+    if request.session_id and request.session_id not in sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+
+    async def event_stream():
+        # Node updates merged together, i.e. the same result run_recommendation returns
+        result = {}
+        try:
+            async for node, update in stream_recommendation(request.prompt):
+                result.update(update)
+                # Snowflake rows can carry Decimal/date values, hence default=str
+                yield {"event": node, "data": orjson.dumps(update, default=str).decode()}
+        except Exception as e:
+            yield {"event": "error", "data": orjson.dumps({"detail": f"Workflow execution failed: {str(e)}"}).decode()}
+        else:
+            if request.session_id and not result.get("early_response"):
+                response = _build_recommendation_response(request.prompt, result)
+                _record_recommendation(request.session_id, request.prompt, response, result)
+        yield {"event": "end", "data": "{}"}
+
+    return EventSourceResponse(event_stream())
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(x_cache_token: Optional[str] = Header(default=None)):
+    """Drop cached recommendations once the Snowflake/Pinecone data has been refreshed"""
+    expected = os.getenv("CACHE_INVALIDATION_TOKEN")
+    if not expected or not x_cache_token or not hmac.compare_digest(x_cache_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid cache invalidation token")
+
+    # Only this instance's in-memory cache is cleared here; other instances
+    # drop theirs once the shared data generation (CACHE_GENERATION_URL) changes
+    invalidate_response_cache()
+    return {
+        "success": True,
+        "scope": "instance",
+        "message": "Cleared this instance's cache only. Other instances refresh when the data generation changes."
+    }
+
 @app.post("/compare")
 async def compare_colleges(request: RecommendationRequest):
     """Dedicated endpoint for college comparisons"""
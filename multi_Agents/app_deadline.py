@@ -1,5 +1,6 @@
 import os
 import re
+from typing import Optional
 from dotenv import load_dotenv
 import snowflake.connector
 
@@ -19,6 +20,12 @@ SNOWFLAKE_CONFIG = {
 COLLEGE_TABLE = "UNIVERSITY_LIST"
 DEFAULT_COLUMNS = ["COLLEGE_NAME", "APPLICATION_DEADLINE"]
 
+# Application-deadline questions ("deadline for X", "when is X's application due")
+DEADLINE_RE = re.compile(r"\b(?:deadlines?|due\s+dates?|applications?\s+(?:is\s+|are\s+)?due)\b", re.IGNORECASE)
+
+# Generic words ignored when comparing a requested college name to a record
+NAME_STOPWORDS = frozenset({"the", "university", "college", "of", "at"})
+
 def get_snowflake_connection():
     """Establish connection to Snowflake"""
     return snowflake.connector.connect(**SNOWFLAKE_CONFIG)
@@ -97,6 +104,48 @@ def fetch_application_deadline(college_name: str) -> dict:
         if 'conn' in locals():
             conn.close()
 
+def normalize_college_name(name: str) -> str:
+    words = re.findall(r"[a-z0-9]+", name.lower())
+    return " ".join(w for w in words if w not in NAME_STOPWORDS)
+
+def fetch_deadline_candidates(college_name: str, limit: int = 20) -> list:
+    """Return every record whose name contains college_name"""
+    query = f"""
+        SELECT COLLEGE_NAME, APPLICATION_DEADLINE
+        FROM {COLLEGE_TABLE}
+        WHERE COLLEGE_NAME ILIKE %s
+        LIMIT {int(limit)}
+    """
+    conn = get_snowflake_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, (f"%{college_name}%",))
+        return [
+            {"college_name": row[0], "application_deadline": row[1]}
+            for row in cursor.fetchall()
+        ]
+    finally:
+        conn.close()
+
+def match_application_deadline(prompt: str) -> Optional[dict]:
+    """
+    Find the deadline record whose normalized name exactly matches the college in the prompt.
+    Confidence is 1 / number of exact matches, so ambiguous names ("Boston") score low.
+    """
+    college_name = extract_college_name(prompt)
+    key = normalize_college_name(college_name) if college_name else ""
+    if not key:
+        return None
+
+    exact = [
+        row for row in fetch_deadline_candidates(college_name)
+        if normalize_college_name(row["college_name"]) == key
+    ]
+    if not exact:
+        return None
+
+    return {**exact[0], "confidence": 1.0 / len(exact)}
+
 def process_deadline_query(prompt: str) -> str:
     """
     Main function to handle deadline queries
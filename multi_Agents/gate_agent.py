@@ -2,8 +2,10 @@ import asyncio
 import logging
 from datetime import datetime
 from typing import List, Dict, Optional
+import httpx
 from newintent.dynamic_handler import DynamicIntentHandler
 from newintent.safety_system import SafetySystem
+from multi_Agents.batching import MicroBatcher
 from sentence_transformers import SentenceTransformer, util
 
 # Setup logging
@@ -14,9 +16,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class CollegeRecommender:
-    def __init__(self):
-        self.safety_system = SafetySystem()
-        self.dynamic_handler = DynamicIntentHandler()
+    def __init__(self, http_async_client: Optional[httpx.AsyncClient] = None):
+        self.safety_system = SafetySystem(http_async_client=http_async_client)
+        self.dynamic_handler = DynamicIntentHandler(http_async_client=http_async_client)
         self.conversation_history: List[Dict] = []
         self.model = SentenceTransformer('all-MiniLM-L6-v2')
         self.college_examples = [
@@ -27,6 +29,10 @@ class CollegeRecommender:
             "Best colleges for computer science in the US"
         ]
         self.college_embeddings = self.model.encode(self.college_examples, convert_to_tensor=True)
+        # Concurrent queries are embedded together in one encode() call; shared with the semantic caches
+        self.encoder = MicroBatcher(
+            lambda queries: list(self.model.encode(queries, convert_to_tensor=True, normalize_embeddings=True))
+        )
 
     async def handle_query(self, query: str) -> Dict:
         logger.info(f"Query: {query}")
@@ -60,12 +66,13 @@ class CollegeRecommender:
             self.conversation_history
         )
 
-    def _is_college_related(self, query: str) -> bool:
-        query_embedding = self.model.encode(query, convert_to_tensor=True)
+    async def _college_similarity(self, query: str, query_embedding=None) -> float:
+        if query_embedding is None:
+            query_embedding = await self.encoder.submit(query)
         similarity_scores = util.cos_sim(query_embedding, self.college_embeddings)
         max_score = float(similarity_scores.max())
         logger.debug(f"Max semantic similarity score: {max_score}")
-        return max_score > 0.5
+        return max_score
 
     def _update_history(self, query: str, response: str, context: str):
         self.conversation_history.append({
@@ -86,7 +93,7 @@ class CollegeRecommender:
             "metadata": metadata or {}
         }
 
-    async def check_and_classify_query(self, query: str) -> Dict:
+    async def check_and_classify_query(self, query: str, query_embedding=None) -> Dict:
         if not query.strip():
             return {
                 "is_college_related": False,
@@ -114,8 +121,8 @@ class CollegeRecommender:
             }
 
         try:
-            is_college = self._is_college_related(query)
-            if not is_college:
+            score = await self._college_similarity(query, query_embedding)
+            if score <= 0.5:
                 general_response = await self.dynamic_handler.handle_unknown(query, self.conversation_history)
                 self._update_history(query, general_response, "general")
                 return {
@@ -0,0 +1,12 @@
+import httpx
+
+# One pooled client shared by every async LLM call, so keep-alive connections
+# are reused instead of paying a TCP + TLS handshake per request
+http_client = httpx.AsyncClient(
+    timeout=30.0,
+    limits=httpx.Limits(max_keepalive_connections=50, max_connections=200)
+)
+
+
+async def aclose_http_client():
+    await http_client.aclose()
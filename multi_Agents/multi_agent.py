@@ -1,149 +1,230 @@
-from typing import TypedDict, Optional, List, Dict
-from langgraph.graph import StateGraph, END
+from typing import Optional, List, Dict, Any, Annotated, AsyncIterator, Tuple
+from langgraph.graph import StateGraph, END, START
+from langgraph.types import Send
 import asyncio
+import copy
+import os
+import re
+import time
+from dataclasses import dataclass, field
 from datetime import datetime
-import json
+import logging
+import httpx
+import orjson
 from multi_Agents.websearch_agent import WebSearchRecommender
 from multi_Agents.gate_agent import CollegeRecommender
 from dotenv import load_dotenv
-from multi_Agents.validate_recommender import validate_and_compare
+from operator import add
+from multi_Agents.validate_recommender import get_snowflake_results, get_rag_results, acombine_results
+from multi_Agents.semantic_cache import SemanticCache, fold_query, normalize_query
+from multi_Agents.http_client import http_client, aclose_http_client
+from multi_Agents.app_deadline import DEADLINE_RE, match_application_deadline
 
 load_dotenv()
 
-class RecommendationState(TypedDict):
-    user_query: str
-    is_college_related: bool
-    is_comparison_query: bool  # New field
-    safety_check_passed: bool
-    combined_agent_results: Optional[str]
-    snowflake_results: List[Dict]
-    rag_results: List[Dict]
-    web_results: List[Dict]
-    final_output: Optional[Dict]
-    early_response: Optional[str]
-    fallback_used: Optional[bool]
-    fallback_message: Optional[str]
+# Level and handlers are configured by the application (see main.py)
+logger = logging.getLogger(__name__)
+
+# The original keywords plus only the inflections its substring scan already matched
+COMPARISON_KEYWORDS: frozenset[str] = frozenset({
+    "compare", "compared", "compares",
+    "vs", "versus", "difference", "differences", "better", "worse", "ranking", "rankings"
+})
+
+# Single-pass, word-bounded comparison detection (so "worse" no longer matches "worsening")
+COMPARE_RE = re.compile(
+    r"\b(?:" + "|".join(sorted(COMPARISON_KEYWORDS, key=lambda k: (-len(k), k))) + r")\b",
+    re.IGNORECASE
+)
+
+# Only these gatekeeper decisions depend on the query alone. Safety blocks can come from a
+# failed moderation call or from the shared conversation history, so they are never reused.
+CACHEABLE_CONTEXTS = frozenset({"college", "general"})
+
+COMPARISON_RESPONSE = "I specialize in college recommendations, not comparisons. Please ask about specific programs or colleges."
+GATEKEEPER_RESPONSE = "Sorry I can't do that. I can assist you with college recommendations."
+# Deadline-match confidence above which a direct answer replaces retrieval
+DIRECT_ANSWER_CONFIDENCE = 0.9
+
+# Prebuilt, read-only node update for the comparison early exit
+_COMPARISON_EXIT = {
+    "is_comparison_query": True,
+    "early_response": COMPARISON_RESPONSE
+}
+
+@dataclass(slots=True)
+class RecommendationState:
+    user_query: str = ""
+    is_college_related: bool = False
+    is_comparison_query: bool = False  # New field
+    safety_check_passed: bool = False
+    combined_agent_results: Optional[str] = None
+    # Accumulators: parallel branches return only the rows they add
+    snowflake_results: Annotated[List[Dict], add] = field(default_factory=list)
+    rag_results: Annotated[List[Dict], add] = field(default_factory=list)
+    web_results: Annotated[List[Dict], add] = field(default_factory=list)
+    snowflake_response: Optional[str] = None
+    rag_response: Optional[str] = None
+    has_valid_data: bool = False
+    should_fallback: Optional[bool] = False
+    final_output: Optional[Dict] = None
+    early_response: Optional[str] = None
+    fallback_used: Optional[bool] = False
+    fallback_message: Optional[str] = None
+    normalized_query: Optional[str] = None
+    query_embedding: Optional[Any] = None
+    routing_cache_hit: Optional[bool] = False
+
+# What the databases subgraph hands back to the main graph
+@dataclass
+class DatabaseResults:
+    snowflake_results: List[Dict] = field(default_factory=list)
+    rag_results: List[Dict] = field(default_factory=list)
+    snowflake_response: Optional[str] = None
+    rag_response: Optional[str] = None
+    combined_agent_results: Optional[str] = None
+    has_valid_data: bool = False
+
+def initial_state(query: str, **overrides) -> RecommendationState:
+    # Field defaults are the template, so a run starts from a single allocation
+    return RecommendationState(user_query=query, **overrides)
 
 workflow = StateGraph(RecommendationState)
 
-college_recommender = CollegeRecommender()
+college_recommender = CollegeRecommender(http_async_client=http_client)
+web_recommender = WebSearchRecommender(http_async_client=http_client)
+# Reuses the gatekeeper's sentence encoder and batcher so no second model is loaded
+routing_cache = SemanticCache(college_recommender.model, encoder=college_recommender.encoder)
 
 async def detect_comparison_node(state: RecommendationState):
     """New node to detect comparison queries"""
-    STANDARD_RESPONSE = "I specialize in college recommendations, not comparisons. Please ask about specific programs or colleges."
-    
     # Simple keyword-based detection (you could replace with LLM-based detection)
-    comparison_keywords = ["compare", "vs", "versus", "difference", "better", "worse", "ranking"]
+    is_comparison = COMPARE_RE.search(state.user_query) is not None
+    
+    logger.info("🔍 Comparison check for: '%s' -> %s", state.user_query, is_comparison)
     
-    query_lower = state['user_query'].lower()
-    is_comparison = any(keyword in query_lower for keyword in comparison_keywords)
+    if is_comparison:
+        return _COMPARISON_EXIT
     
-    print(f"\n🔍 Comparison check for: '{state['user_query']}'")
-    print(f"Comparison detected: {is_comparison}")
+    # Reuse a previous gatekeeper decision for near-paraphrase queries
+    normalized = state.normalized_query or normalize_query(state.user_query)
+    embedding = state.query_embedding
+    if embedding is None:
+        embedding = await routing_cache.aembed(normalized)
+    cached = routing_cache.lookup(embedding)
+    
+    # Hard-blocked terms are always rejected by the gatekeeper, never by the cache
+    if cached and not college_recommender.safety_system.is_hard_blocked(state.user_query):
+        logger.info("⚡ Routing cache hit (context: %s)", cached['context'])
+        return {
+            "is_comparison_query": False,
+            "is_college_related": cached["is_college_related"],
+            "safety_check_passed": cached["safety_check_passed"],
+            "early_response": None if cached["context"] == "college" else cached["response"],
+            "routing_cache_hit": True
+        }
     
     return {
-        "is_comparison_query": is_comparison,
-        "early_response": STANDARD_RESPONSE if is_comparison else None
+        "is_comparison_query": False,
+        "early_response": None,
+        "normalized_query": normalized,
+        "query_embedding": embedding,
+        "routing_cache_hit": False
     }
 
 async def check_prompt_node(state: RecommendationState):
-    STANDARD_RESPONSE = "Sorry I can't do that. I can assist you with college recommendations."
+    logger.info("🔍 Processing query: '%s'", state.user_query)
     
-    print(f"\n🔍 Processing query: '{state['user_query']}'")
+    # The cache embedding is of the normalized query, so it only stands in for the raw
+    # query when no abbreviation was expanded; otherwise the classifier embeds the raw text
+    embedding = state.query_embedding if state.normalized_query == fold_query(state.user_query) else None
+    classification = await college_recommender.check_and_classify_query(state.user_query, embedding)
     
-    # Skip classification if already identified as comparison
-    if state.get('is_comparison_query', False):
-        return {
-            "is_college_related": False,
-            "safety_check_passed": False,
-            "early_response": state.get('early_response', STANDARD_RESPONSE)
-        }
+    logger.info(
+        "📊 Classification results: is_college_related=%s safety_check_passed=%s context=%s",
+        classification['is_college_related'],
+        classification['safety_check_passed'],
+        classification['context']
+    )
     
-    classification = await college_recommender.check_and_classify_query(state['user_query'])
-    
-    print(f"📊 Classification results:")
-    print(f"  - is_college_related: {classification['is_college_related']}")
-    print(f"  - safety_check_passed: {classification['safety_check_passed']}")
-    print(f"  - context: {classification['context']}")
+    if classification["context"] in CACHEABLE_CONTEXTS and state.query_embedding is not None:
+        routing_cache.store(state.normalized_query, state.query_embedding, {
+            "is_comparison": False,
+            "is_college_related": classification["is_college_related"],
+            "safety_check_passed": classification["safety_check_passed"],
+            "context": classification["context"],
+            "response": classification.get("response", GATEKEEPER_RESPONSE)
+        })
     
     if classification["context"] != "college":
-        print("❌ Query rejected (not college-related or failed safety check)")
+        logger.info("❌ Query rejected (not college-related or failed safety check)")
         return {
             "is_college_related": False,
             "safety_check_passed": classification["safety_check_passed"],
-            "early_response": classification.get("response", STANDARD_RESPONSE)
+            "early_response": classification.get("response", GATEKEEPER_RESPONSE)
         }
     
-    print("✅ Query accepted as college-related")
+    logger.info("✅ Query accepted as college-related")
     return {
         "is_college_related": True,
         "safety_check_passed": True
     }
 
-#output from our rag and snowflake agents
-async def query_combined_agent_node(state: RecommendationState):
-    '''
-    """TEST VERSION - Always returns empty results to trigger fallback"""
-    print("\n🔍 TEST MODE: Combined agent returning empty results to trigger fallback")
+#deadline questions for a uniquely matched college are answered straight from Snowflake
+async def direct_answer_node(state: RecommendationState):
+    try:
+        match = await asyncio.to_thread(match_application_deadline, state.user_query)
+    except Exception as e:
+        logger.error("❌ Deadline lookup error: %s", e)
+        return {}
     
+    if not match or match["confidence"] <= DIRECT_ANSWER_CONFIDENCE:
+        return {}
+    
+    logger.info("🎯 Answered directly (confidence %.2f), skipping retrieval", match["confidence"])
     return {
-        **state,  # Preserve existing state
-        "combined_agent_results": None,
-        "snowflake_results": [],  # Empty list to trigger fallback
-        "rag_results": [],  # Empty list to trigger fallback
-        "fallback_used": False  # Not yet used, but will be triggered by check_results_node
+        "early_response": f"The application deadline for {match['college_name']} is {match['application_deadline']}."
     }
-'''
-    try:
-        result = validate_and_compare(state['user_query'])
-        
-        print("\n🔍 Raw results from validate_and_compare:")
-        print(f"Combined output length: {len(result.get('combined_agent_results', ''))}")
-        print(f"Snowflake results type: {type(result.get('snowflake_results'))} count: {len(result.get('snowflake_results', []))}")
-        print(f"RAG results type: {type(result.get('rag_results'))} count: {len(result.get('rag_results', []))}")
 
+#retriever branches, dispatched in parallel once the query is accepted
+def dispatch(state: RecommendationState):
+    # Branches only read the query; Send payloads skip schema coercion, so build the state object here
+    branch_input = RecommendationState(user_query=state.user_query)
+    return [
+        Send("databases", branch_input),
+        Send("web_speculative", branch_input)
+    ]
+
+# Snowflake and RAG clients are blocking, so they run in worker threads to keep the event loop free
+async def snowflake_node(state: RecommendationState):
+    try:
+        snowflake_results, snowflake_response = await asyncio.to_thread(get_snowflake_results, state.user_query)
+        logger.info("❄️ Snowflake results count: %d", len(snowflake_results))
         return {
-            **state,  
-            "combined_agent_results": result["combined_agent_results"],
-            "snowflake_results": result.get("snowflake_results", []),
-            "rag_results": result.get("rag_results", []),
-            "fallback_used": False
+            "snowflake_results": snowflake_results,
+            "snowflake_response": snowflake_response
         }
     except Exception as e:
-        print(f"❌ Combined agent error: {e}")
+        logger.error("❌ Snowflake agent error: %s", e)
+        return {"snowflake_response": None}
+
+async def rag_node(state: RecommendationState):
+    try:
+        rag_results, rag_response = await asyncio.to_thread(get_rag_results, state.user_query)
+        logger.info("📚 RAG results count: %d", len(rag_results))
         return {
-            **state,
-            "combined_agent_results": None,
-            "snowflake_results": [],
-            "rag_results": [],
-            "fallback_used": True,
-            "fallback_message": "Error processing your request"
+            "rag_results": rag_results,
+            "rag_response": rag_response
         }
+    except Exception as e:
+        logger.error("❌ RAG agent error: %s", e)
+        return {"rag_response": None}
 
-#checking output for fallback trigger
-async def check_results_node(state: RecommendationState):
-    """Check if we should fall back to web search"""
-    no_data = (not state.get('snowflake_results') and 
-               not state.get('rag_results'))
-    
-
-    combined_empty = (state.get('combined_agent_results') and 
-                     "❌ No valid data found" in state['combined_agent_results'])
-    
-    if no_data or combined_empty:
-        print("⚠️ Both Snowflake and RAG returned empty results")
-        return {"should_fallback": True}
-    
-    return {"should_fallback": False}
-
-async def query_web_node(state: RecommendationState):
+#web search runs speculatively alongside the databases and is only kept if they come back empty
+async def web_speculative_node(state: RecommendationState):
     """Process query with existing Web Search agent"""
     try:
-       
-        recommender = WebSearchRecommender()
-        
-       
-        result = await recommender.recommend(state['user_query'])
+        result = await web_recommender.recommend(state.user_query)
         
         # Format the results to match our multi-agent structure
         formatted_results = [{
@@ -154,34 +235,57 @@ async def query_web_node(state: RecommendationState):
             }
         }]
         
-        print("\n🌐 Web Search Raw Output (Fallback):")
-        print(json.dumps(formatted_results, indent=2))
-        return {
-            "web_results": formatted_results,
-            "fallback_used": True,
-            "fallback_message": "We're using web search results as a fallback since we couldn't find relevant information in our databases."
-        }
+        # Pretty-printing the raw web payload is only worth it when debugging
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🌐 Web Search Raw Output (Speculative):\n%s",
+                         orjson.dumps(formatted_results, option=orjson.OPT_INDENT_2).decode())
+        return {"web_results": formatted_results}
     except Exception as e:
-        print(f"❌ Web Search error: {e}")
-        return {
-            "web_results": [],
-            "fallback_used": False
-        }
+        logger.error("❌ Web Search error: %s", e)
+        return {}
+
+#output from our rag and snowflake agents
+async def query_combined_agent_node(state: RecommendationState):
+    # Nothing to validate if neither database produced results
+    if not state.snowflake_results and not state.rag_results:
+        return {"combined_agent_results": None, "has_valid_data": False}
+    
+    try:
+        combined, has_valid_data = await acombine_results(
+            state.user_query,
+            state.snowflake_response,
+            state.rag_response
+        )
+        logger.info("🔍 Combined output length: %d", len(combined))
+        return {"combined_agent_results": combined, "has_valid_data": has_valid_data}
+    except Exception as e:
+        logger.error("❌ Combined agent error: %s", e)
+        return {"combined_agent_results": None, "has_valid_data": False}
+
+#checking output for fallback trigger
+async def check_results_node(state: RecommendationState):
+    """Check if we should fall back to web search"""
+    if not state.has_valid_data:
+        logger.warning("⚠️ Both Snowflake and RAG returned empty results")
+        return {"should_fallback": True}
+    
+    return {"should_fallback": False}
 
 #compiling all the results
 def compile_results(state: RecommendationState):
     output = {
-        "query": state['user_query'],
-        "combined_output": state.get('combined_agent_results'),
-        "snowflake": state.get('snowflake_results', []),
-        "rag": state.get('rag_results', [])
+        "query": state.user_query,
+        "combined_output": state.combined_agent_results,
+        "snowflake": state.snowflake_results,
+        "rag": state.rag_results
     }
     
-    if state.get('fallback_used', False):
+    # Speculative web results are only surfaced when the databases had nothing
+    if state.should_fallback and state.web_results:
         output.update({
-            "web": state.get('web_results', []),
+            "web": state.web_results,
             "fallback_used": True,
-            "fallback_message": state.get('fallback_message', '')
+            "fallback_message": "We're using web search results as a fallback since we couldn't find relevant information in our databases."
         })
     else:
         output.update({
@@ -189,29 +293,62 @@ def compile_results(state: RecommendationState):
             "fallback_used": False
         })
         
-    return {"final_output": output}
+    return {"final_output": output, "fallback_used": output["fallback_used"]}
+
 
 
 
 
+# Snowflake + RAG + validation run as one subgraph, so validation starts as soon as
+# both databases return instead of waiting for the (slower) web search superstep
+databases = StateGraph(RecommendationState, output=DatabaseResults)
+databases.add_node("snowflake", snowflake_node)
+databases.add_node("rag", rag_node)
+databases.add_node("combined_agent", query_combined_agent_node)
+databases.add_edge(START, "snowflake")
+databases.add_edge(START, "rag")
+databases.add_edge(["snowflake", "rag"], "combined_agent")
+databases.add_edge("combined_agent", END)
 
 # Modified workflow construction
 workflow.add_node("detect_comparison", detect_comparison_node)
 workflow.add_node("gatekeeper", check_prompt_node)
-workflow.add_node("combined_agent", query_combined_agent_node)
+workflow.add_node("direct_answer", direct_answer_node)
+workflow.add_node("databases", databases.compile())
+workflow.add_node("web_speculative", web_speculative_node)
 workflow.add_node("check_results", check_results_node)
-workflow.add_node("web", query_web_node)
 workflow.add_node("compile", compile_results)
 
 workflow.set_entry_point("detect_comparison")
 
-# First decision point - is this a comparison?
+# Accepted queries try the direct-answer path first when they ask for a deadline.
+# This also runs on routing cache hits, since deadline queries for different
+# colleges embed almost identically.
+def route_accepted(state: RecommendationState):
+    if DEADLINE_RE.search(state.user_query):
+        return "direct_answer"
+    return dispatch(state)
+
+def route_after_detection(state: RecommendationState):
+    if state.is_comparison_query:
+        return "early_exit"
+    # A routing cache hit already carries the gatekeeper decision
+    if state.routing_cache_hit:
+        if not state.is_college_related or not state.safety_check_passed:
+            return "early_exit"
+        return route_accepted(state)
+    return "gatekeeper"
+
+# First decision point - is this a comparison (or an already-classified query)?
 workflow.add_conditional_edges(
     "detect_comparison",
-    lambda state: "early_exit" if state.get("is_comparison_query", False) else "gatekeeper",
+    route_after_detection,
     {
         "early_exit": END,
-        "gatekeeper": "gatekeeper"
+        "gatekeeper": "gatekeeper",
+        "direct_answer": "direct_answer",
+        "databases": "databases",
+        "web_speculative": "web_speculative"
     }
 )
 
@@ -220,86 +357,213 @@ workflow.add_conditional_edges(
     "gatekeeper",
     lambda state: (
         "early_exit" 
-        if not state["is_college_related"] or not state["safety_check_passed"] 
-        else "combined_agent"
+        if not state.is_college_related or not state.safety_check_passed 
+        else route_accepted(state)
     ),
     {
         "early_exit": END,
-        "combined_agent": "combined_agent"
+        "direct_answer": "direct_answer",
+        "databases": "databases",
+        "web_speculative": "web_speculative"
     }
 )
 
-workflow.add_edge("combined_agent", "check_results")
+# A confident deadline answer ends the run; otherwise fall through to retrieval
 workflow.add_conditional_edges(
-    "check_results",
-    lambda state: "web" if state.get("should_fallback", False) else "compile",
+    "direct_answer",
+    lambda state: "direct_answer_end" if state.early_response else dispatch(state),
+    {
+        "direct_answer_end": END,
+        "databases": "databases",
+        "web_speculative": "web_speculative"
+    }
 )
-workflow.add_edge("web", "compile")
+
+# Fallback decision waits for the validated database answer and the web search,
+# so end-to-end latency is max(databases + validation, web)
+workflow.add_edge(["databases", "web_speculative"], "check_results")
+workflow.add_edge("check_results", "compile")
 workflow.add_edge("compile", END)
 
-# Compile the graph
-app = workflow.compile()
+# Compile the graph once; the longest path is 6 supersteps
+app = workflow.compile().with_config({"recursion_limit": 8})
+
+# ---------- Response Cache ----------
+# In-process and per worker. Instances stay in sync through a shared data generation
+# marker that the Airflow DAG rewrites after every refresh; a change drops the cache.
+RESPONSE_CACHE_TTL = 24 * 3600
+# Rankings move more often than program facts
+RANKING_RESPONSE_TTL = 3600
+RANKING_RE = re.compile(r"\b(?:rank(?:ed|s|ings?)?|top|best)\b", re.IGNORECASE)
+
+response_cache = SemanticCache(college_recommender.model, threshold=0.95, ttl_seconds=RESPONSE_CACHE_TTL,
+                               encoder=college_recommender.encoder)
+
+CACHE_GENERATION_URL = os.getenv("CACHE_GENERATION_URL")
+CACHE_GENERATION_CHECK_INTERVAL = 60
+_cache_generation: Optional[str] = None
+_cache_generation_checked_at = float("-inf")
+
+def invalidate_response_cache():
+    """Drop all cached answers, e.g. after the Snowflake/Pinecone data is refreshed"""
+    response_cache.clear()
+
+async def _sync_cache_generation():
+    """Clear the response cache when the shared data generation has changed since the last check"""
+    global _cache_generation, _cache_generation_checked_at
+    if not CACHE_GENERATION_URL:
+        return
+    
+    # Set before awaiting so concurrent requests don't all fetch the marker
+    now = time.monotonic()
+    if now - _cache_generation_checked_at < CACHE_GENERATION_CHECK_INTERVAL:
+        return
+    _cache_generation_checked_at = now
+    
+    try:
+        response = await http_client.get(CACHE_GENERATION_URL, timeout=2.0)
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning("⚠️ Could not read cache generation: %s", e)
+        return
+    
+    generation = response.text.strip()
+    if generation != _cache_generation:
+        if _cache_generation is not None:
+            logger.info("🧹 Data generation changed (%s), dropping cached responses", generation)
+        invalidate_response_cache()
+        _cache_generation = generation
+
+def _is_response_cacheable(query: str) -> bool:
+    # Comparisons and hard-blocked queries must always go through the graph
+    return (COMPARE_RE.search(query) is None and
+            not college_recommender.safety_system.is_hard_blocked(query))
+
+async def _lookup_response(query: str) -> Tuple[Optional[Dict], Optional[RecommendationState]]:
+    """Returns a cached final_output (or None) and the graph input for a miss"""
+    await _sync_cache_generation()
+    normalized = normalize_query(query)
+    embedding = None
+    
+    if _is_response_cacheable(query):
+        cached = response_cache.get(normalized)
+        if cached is None:
+            embedding = await response_cache.aembed(normalized)
+            cached = response_cache.lookup(embedding)
+        
+        if cached is not None:
+            logger.info("⚡ Response cache hit for: '%s'", query)
+            cached["query"] = query
+            return cached, None
+    
+    return None, initial_state(query, normalized_query=normalized, query_embedding=embedding)
+
+def _store_response(graph_input: RecommendationState, final_output: Optional[Dict]):
+    # Only cacheable queries were embedded up front
+    if graph_input.query_embedding is None or not final_output:
+        return
+    if not (final_output.get("snowflake") or final_output.get("rag") or final_output.get("web")):
+        return
+    query = graph_input.user_query
+    ttl = RANKING_RESPONSE_TTL if RANKING_RE.search(query) else RESPONSE_CACHE_TTL
+    response_cache.store(graph_input.normalized_query, graph_input.query_embedding,
+                         copy.deepcopy(final_output), ttl_seconds=ttl)
+
+async def run_recommendation(query: str) -> Dict:
+    """Run the workflow for a query, answering repeat/paraphrased queries from cache"""
+    cached, graph_input = await _lookup_response(query)
+    if cached is not None:
+        return {
+            "user_query": query,
+            "is_college_related": True,
+            "safety_check_passed": True,
+            "early_response": None,
+            "final_output": cached,
+            "fallback_used": cached.get("fallback_used", False)
+        }
+    
+    result = await app.ainvoke(graph_input)
+    _store_response(graph_input, result.get("final_output"))
+    return result
+
+# Internal routing fields that are not useful (or serializable) for clients
+_PRIVATE_STATE_KEYS = frozenset({"normalized_query", "query_embedding", "routing_cache_hit"})
+
+async def stream_recommendation(query: str) -> AsyncIterator[Tuple[str, Dict]]:
+    """Yield (node, update) pairs as each node finishes, so callers can show partial results"""
+    cached, graph_input = await _lookup_response(query)
+    if cached is not None:
+        yield "compile", {
+            "is_college_related": True,
+            "safety_check_passed": True,
+            "final_output": cached,
+            "fallback_used": cached.get("fallback_used", False)
+        }
+        return
+    
+    # Speculative web rows are held back until check_results decides whether they are used
+    held_web_update = None
+    
+    # subgraphs=True surfaces snowflake/rag/combined_agent as they finish
+    async for namespace, chunk in app.astream(graph_input, stream_mode="updates", subgraphs=True):
+        for node, update in chunk.items():
+            # The databases subgraph's aggregate output repeats its inner updates
+            if not update or (not namespace and node == "databases"):
+                continue
+            if node == "web_speculative":
+                held_web_update = update
+                continue
+            if node == "check_results":
+                if update.get("should_fallback") and held_web_update:
+                    yield "web_speculative", held_web_update
+                held_web_update = None
+            if node == "compile":
+                _store_response(graph_input, update.get("final_output"))
+            yield node, {k: v for k, v in update.items() if k not in _PRIVATE_STATE_KEYS}
 
 async def test_workflow(query: str):
     print(f"\n🔍 Testing query: '{query}'")
-    initial_state = {
-        "user_query": query,
-        "is_college_related": False,
-        "safety_check_passed": False,
-        "combined_agent_results": None,
-        "snowflake_results": [],  
-        "rag_results": [],  
-        "web_results": [],
-        "final_output": None,
-        "early_response": None,
-        "fallback_used": False,
-        "fallback_message": None
-    }
-    
-    result = await app.ainvoke(initial_state)
+    result = await app.ainvoke(initial_state(query))
     
     print("\n📊 Final State Inspection:")
     print(f"Final output keys: {result['final_output'].keys()}")
     print(f"Snowflake results sample: {result['final_output'].get('snowflake', [])[:1]}")
     print(f"RAG results sample: {result['final_output'].get('rag', [])[:1]}")
 
-if __name__ == "__main__":
+async def run_test_queries():
+    # One event loop for every query: the pooled http client and encoder batchers bind to it
     test_queries = [
         "What MBA programs does Stanford offer for finance specialization?"
     ]
     
-    for query in test_queries:
-        print(f"\n{'='*50}\nTesting: '{query}'")
-        result = asyncio.run(app.ainvoke({
-            "user_query": query,
-            "is_college_related": False,
-            "safety_check_passed": False,
-            "early_response": None,
-            "combined_agent_results": None, 
-            "web_results": [],
-            "final_output": None,
-            "fallback_used": False,
-            "fallback_message": None
-        }))
+    try:
+        for query in test_queries:
+            print(f"\n{'='*50}\nTesting: '{query}'")
+            result = await app.ainvoke(initial_state(query))
         
-        if result.get("early_response"):
-            print(f"RESPONSE: {result['early_response']}")
-        else:
-            print("PROCESSED COLLEGE QUERY")
-            final_output = result.get('final_output', {})
+            if result.get("early_response"):
+                print(f"RESPONSE: {result['early_response']}")
+            else:
+                print("PROCESSED COLLEGE QUERY")
+                final_output = result.get('final_output', {})
             
-            # Print fallback status if used
-            if final_output.get('fallback_used'):
-                print("\n⚠️ Fallback Web Search Used")
-                print(f"Message: {final_output.get('fallback_message', '')}")
+                # Print fallback status if used
+                if final_output.get('fallback_used'):
+                    print("\n⚠️ Fallback Web Search Used")
+                    print(f"Message: {final_output.get('fallback_message', '')}")
                 
-                # Print web results if available
-                if final_output.get('web'):
-                    print("\nWeb Search Results:")
-                    for i, res in enumerate(final_output['web'], 1):
-                        print(f"{i}. {res.get('text', '')[:200]}...")
+                    # Print web results if available
+                    if final_output.get('web'):
+                        print("\nWeb Search Results:")
+                        for i, res in enumerate(final_output['web'], 1):
+                            print(f"{i}. {res.get('text', '')[:200]}...")
             
-            # Print combined results if available
-            if final_output.get('combined_output'):
-                print("\n🎯 COMBINED AGENT RESULTS:")
-                print(final_output['combined_output'])
\ No newline at end of file
+                # Print combined results if available
+                if final_output.get('combined_output'):
+                    print("\n🎯 COMBINED AGENT RESULTS:")
+                    print(final_output['combined_output'])
+    finally:
+        await aclose_http_client()
+
+if __name__ == "__main__":
+    asyncio.run(run_test_queries())
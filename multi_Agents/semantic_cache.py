@@ -0,0 +1,118 @@
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from sentence_transformers import SentenceTransformer, util
+
+from multi_Agents.batching import MicroBatcher
+
+# ---------- Query Standardization ----------
+ABBREVIATIONS = {
+    "univ": "university",
+    "uni": "university",
+    "cs": "computer science",
+    "ds": "data science",
+    "ece": "electrical and computer engineering",
+    "ee": "electrical engineering",
+    "mech": "mechanical engineering",
+    "ms": "masters",
+    "phd": "doctorate",
+    "ug": "undergraduate",
+    "grad": "graduate",
+    "w": "with",
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_WORD_RE = re.compile(r"\b\w+\b")
+
+
+def fold_query(query: str) -> str:
+    """Lowercase and collapse whitespace; the (uncased) encoder embeds the result identically"""
+    return _WHITESPACE_RE.sub(" ", query.strip().lower())
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and expand common abbreviations"""
+    return _WORD_RE.sub(lambda m: ABBREVIATIONS.get(m.group(0), m.group(0)), fold_query(query))
+
+
+# ---------- Semantic Cache ----------
+class SemanticCache:
+    """LRU + TTL cache of query embeddings mapped to previously computed results"""
+
+    def __init__(self, model: SentenceTransformer, threshold: float = 0.92,
+                 max_entries: int = 1024, ttl_seconds: float = 3600,
+                 encoder: Optional[MicroBatcher] = None):
+        self.model = model
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, embedding, value)
+        self._entries: "OrderedDict[str, Tuple[float, torch.Tensor, Dict]]" = OrderedDict()
+        # Stacked embeddings for a single similarity pass; rebuilt when entries change
+        self._keys: List[str] = []
+        self._matrix: Optional[torch.Tensor] = None
+        # Pass an existing batcher (with normalized embeddings) to share encode() calls with other users of the model
+        self._encoder = encoder or MicroBatcher(self._embed_batch)
+
+    def embed(self, query: str) -> torch.Tensor:
+        return self.model.encode(query, convert_to_tensor=True, normalize_embeddings=True)
+
+    async def aembed(self, query: str) -> torch.Tensor:
+        """Embed off the event loop, batched with other concurrent callers"""
+        return await self._encoder.submit(query)
+
+    def _embed_batch(self, queries: List[str]) -> List[torch.Tensor]:
+        return list(self.model.encode(queries, convert_to_tensor=True, normalize_embeddings=True))
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Exact-match lookup on the normalized query, skipping the embedding"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            self._matrix = None
+            return None
+        self._entries.move_to_end(key)
+        return dict(entry[2])
+
+    def lookup(self, embedding: torch.Tensor) -> Optional[Dict]:
+        self._evict_expired()
+        if not self._entries:
+            return None
+
+        if self._matrix is None:
+            self._keys = list(self._entries)
+            self._matrix = torch.stack([self._entries[k][1] for k in self._keys])
+
+        scores = util.cos_sim(embedding, self._matrix)[0]
+        best = int(scores.argmax())
+        if float(scores[best]) < self.threshold:
+            return None
+
+        key = self._keys[best]
+        self._entries.move_to_end(key)
+        return dict(self._entries[key][2])
+
+    def store(self, key: str, embedding: torch.Tensor, value: Dict, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, embedding, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def clear(self):
+        self._entries.clear()
+        self._matrix = None
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        expired = [k for k, (expires_at, _, _) in self._entries.items() if expires_at < now]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
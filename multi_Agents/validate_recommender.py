@@ -1,6 +1,9 @@
 import os
+from typing import Dict, List, Optional, Tuple
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import DEFAULT_TIMEOUT, AsyncOpenAI, OpenAI
+
+from multi_Agents.http_client import http_client
 
 from multi_Agents.recommendation_snowflake import search_and_filter, generate_recommendation
 from multi_Agents.RecommenderRAG_4 import PineconeRetriever, GPT4Recommender, CourseRecommenderAgent, index
@@ -9,17 +12,22 @@ from multi_Agents.RecommenderRAG_4 import PineconeRetriever, GPT4Recommender, Co
 load_dotenv("Agents/.env")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 openai_client = OpenAI(api_key=OPENAI_API_KEY)
+# The pooled client's 30s timeout would otherwise replace the SDK's 600s default for GPT-4 validation
+async_openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY, http_client=http_client, timeout=DEFAULT_TIMEOUT)
 
 # ---------- Initialize Agents ----------
 retriever = PineconeRetriever(index)
 gpt4 = GPT4Recommender()
 rag_agent = CourseRecommenderAgent(retriever, gpt4)
 
-# ---------- Validator Agent with Code 2 Output Structure ----------
-def validate_and_compare(prompt: str) -> dict:
-    # Get responses from both agents
+# ---------- Snowflake Agent ----------
+def get_snowflake_results(prompt: str) -> Tuple[List[Dict], Optional[str]]:
     snowflake_data = search_and_filter(prompt)
     snowflake_response = generate_recommendation(prompt, snowflake_data) if snowflake_data else None
+    return snowflake_data or [], snowflake_response
+
+# ---------- RAG Agent ----------
+def get_rag_results(prompt: str) -> Tuple[List[Dict], Optional[str]]:
     rag_response = rag_agent.recommend(prompt)
 
     # Process RAG response to match Code 2 structure
@@ -27,8 +35,14 @@ def validate_and_compare(prompt: str) -> dict:
     if rag_response and "no relevant course information" not in rag_response.lower():
         rag_clean = [r.strip() for r in rag_response.split("\n") if "⚠️" not in r and r.strip()]
 
+    return [{"text": course, "metadata": {"source": "rag"}} for course in rag_clean], rag_response
+
+# ---------- Validator Agent ----------
+NO_VALID_DATA_MESSAGE = "❌ No valid data found in either Snowflake or RAG system. Please refine your query or use web search."
+
+def _build_combined_prompt(prompt: str, snowflake_response: Optional[str], rag_response: Optional[str]) -> str:
     # Generate combined response using GPT-4 (Code 1 approach)
-    combined_prompt = f"""
+    return f"""
 You are a university and course recommendation validator.
 
 USER PROMPT:
@@ -46,20 +60,45 @@ Read the user prompt and the outputs from both agents.
 1. If either output contains information relevant to the user prompt, generate a clean, well-formatted answer using the data provided.
 2. If neither output is relevant to the user prompt, return an empty string only.
 """
-    
-    gpt_response = openai_client.chat.completions.create(
-        model="gpt-4",
-        messages=[{"role": "user", "content": combined_prompt}],
-        temperature=0.4
-    )
+
+def _combined_request(prompt: str, snowflake_response: Optional[str], rag_response: Optional[str]) -> Dict:
+    return {
+        "model": "gpt-4",
+        "messages": [{"role": "user", "content": _build_combined_prompt(prompt, snowflake_response, rag_response)}],
+        "temperature": 0.4
+    }
+
+def _parse_combined_response(gpt_response) -> Tuple[str, bool]:
+    # An empty completion is the validator's way of saying neither source was relevant
     final_response = gpt_response.choices[0].message.content.strip()
+    if not final_response:
+        return NO_VALID_DATA_MESSAGE, False
+    return final_response, True
+
+def combine_results(prompt: str, snowflake_response: Optional[str], rag_response: Optional[str]) -> Tuple[str, bool]:
+    """Returns the validated answer and whether it contains any usable data"""
+    gpt_response = openai_client.chat.completions.create(**_combined_request(prompt, snowflake_response, rag_response))
+    return _parse_combined_response(gpt_response)
+
+async def acombine_results(prompt: str, snowflake_response: Optional[str], rag_response: Optional[str]) -> Tuple[str, bool]:
+    """Non-blocking variant of combine_results for use inside the event loop"""
+    gpt_response = await async_openai_client.chat.completions.create(**_combined_request(prompt, snowflake_response, rag_response))
+    return _parse_combined_response(gpt_response)
+
+# ---------- Validator Agent with Code 2 Output Structure ----------
+def validate_and_compare(prompt: str) -> dict:
+    # Get responses from both agents
+    snowflake_results, snowflake_response = get_snowflake_results(prompt)
+    rag_results, rag_response = get_rag_results(prompt)
+
+    combined, has_valid_data = combine_results(prompt, snowflake_response, rag_response)
 
     # Return in Code 2 output structure
     return {
-        "combined_agent_results": final_response if final_response else 
-            "❌ No valid data found in either Snowflake or RAG system. Please refine your query or use web search.",
-        "snowflake_results": snowflake_data if snowflake_data else [],
-        "rag_results": [{"text": course, "metadata": {"source": "rag"}} for course in rag_clean]
+        "combined_agent_results": combined,
+        "snowflake_results": snowflake_results,
+        "rag_results": rag_results,
+        "has_valid_data": has_valid_data and bool(snowflake_results or rag_results)
     }
 
 # ---------- CLI for Interactive Testing ----------
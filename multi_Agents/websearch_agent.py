@@ -1,5 +1,6 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 import asyncio
+import httpx
 from langchain_community.utilities import GoogleSerperAPIWrapper
 from langchain_openai import ChatOpenAI
 import os
@@ -8,12 +9,12 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class WebSearchRecommender:
-    def __init__(self):
+    def __init__(self, http_async_client: Optional[httpx.AsyncClient] = None):
         self.search = GoogleSerperAPIWrapper(
             serper_api_key=os.getenv("SERPER_API_KEY"),
             k=7  # Get more results for GPT to analyze
         )
-        self.llm = ChatOpenAI(model="gpt-4-turbo")  # Using more capable model
+        self.llm = ChatOpenAI(model="gpt-4-turbo", http_async_client=http_async_client)  # Using more capable model
 
     async def recommend(self, query: str) -> Dict:
         """End-to-end recommendation with minimal processing"""
@@ -40,7 +41,7 @@ class WebSearchRecommender:
     async def _web_search(self, query: str) -> str:
         """Get raw search results as string"""
         try:
-            results = self.search.results(query)
+            results = await self.search.aresults(query)
             return str(results)  # Pass complete raw results
         except Exception as e:
             return f"Search error: {str(e)}"
@@ -1,9 +1,10 @@
 from langchain_openai import ChatOpenAI
-from typing import List, Dict
+from typing import List, Dict, Optional
+import httpx
 
 class DynamicIntentHandler:
-    def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.3)
+    def __init__(self, http_async_client: Optional[httpx.AsyncClient] = None):
+        self.llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0.3, http_async_client=http_async_client)
         self.examples = [
             "Find colleges with strong CS programs",
             "Suggest universities for 3.5 GPA students",
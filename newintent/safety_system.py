@@ -1,16 +1,19 @@
 import json
-from typing import Dict, List
+from typing import Dict, List, Optional
+import httpx
 from langchain_openai import ChatOpenAI
 
+COLLEGE_KEYWORDS = frozenset({"college", "university", "degree", "major", "gpa", "tuition"})
+
 class SafetySystem:
-    def __init__(self):
+    def __init__(self, http_async_client: Optional[httpx.AsyncClient] = None):
         self.hard_blocks = {
             "api key", "credentials", "admin", "password",
             "exploit", "hack", "sql injection", "xss",
             "remote code", "system(", "eval(", "exec(",
             "import os", "delete from", "drop table"
         }
-        self.llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0)
+        self.llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0, http_async_client=http_async_client)
         self.max_retries = 2
 
     async def check_query(self, query: str, history: List[Dict]) -> Dict:
@@ -45,6 +48,10 @@ class SafetySystem:
 
         return {"safe": True}
 
+    def is_hard_blocked(self, query: str) -> bool:
+        """Cheap keyword check that needs no LLM call"""
+        return self._hard_block_check(query)
+
     def _hard_block_check(self, query: str) -> bool:
         query_lower = query.lower()
         return any(block in query_lower for block in self.hard_blocks)
@@ -84,5 +91,5 @@ Query: {query}"""
         return all(not self._is_college_related(q) for q in last_interactions + [query])
 
     def _is_college_related(self, query: str) -> bool:
-        college_keywords = {"college", "university", "degree", "major", "gpa", "tuition"}
-        return any(keyword in query.lower() for keyword in college_keywords)
\ No newline at end of file
+        query_lower = query.lower()
+        return any(keyword in query_lower for keyword in COLLEGE_KEYWORDS)
\ No newline at end of file